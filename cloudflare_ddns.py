@@ -4,70 +4,93 @@ Cloudflare DDNS 更新脚本 (Python跨平台版)
 新增配置文件删除功能
 """
 
-import os
 import sys
 import json
 import logging
-import argparse
-import subprocess
-import importlib.util
+import logging.handlers
+import math
+import functools
+import ipaddress
+import queue
+import random
+import signal
+import socket
+import ssl
+import threading
+import time
+import types
 from pathlib import Path
-from datetime import datetime
+from urllib.parse import quote
+
+# 检查依赖
+try:
+    import requests
+except ImportError:
+    sys.stderr.write("❌ 缺少必要模块: requests\n   请运行: pip install requests\n")
+    sys.exit(1)
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+from urllib3.util.retry import Retry
+
+# JSON编解码：优先使用orjson（可选依赖），未安装时回退到标准库json
+try:
+    import orjson
+    
+    def json_loads(data):
+        return orjson.loads(data)
+    
+    def json_dumps(obj, indent=False):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+except ImportError:
+    def json_loads(data):
+        return json.loads(data)
+    
+    def json_dumps(obj, indent=False):
+        return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
 
 # 全局配置目录
 CFG_DIR = Path.home() / ".cloudflare_ddns"
 CFG_FILE = CFG_DIR / "config.json"
 LOG_FILE = CFG_DIR / "cloudflare_ddns.log"
+STATE_FILE = CFG_DIR / "state.json"
+RATELIMIT_FILE = CFG_DIR / "ratelimit.json"
+CF_IP_FILE = CFG_DIR / "cf_ip.json"
+IP_STATS_FILE = CFG_DIR / "ip_services.json"
 
-# 检查并安装依赖
-def check_dependencies():
-    """确保必要的依赖已安装"""
-    required = {'requests'}
-    installed = set()
-    
-    for module in required:
-        if importlib.util.find_spec(module) is None:
-            print(f"缺少必要模块: {module}")
-            
-            # 尝试使用pip安装
-            python_exe = sys.executable
-            pip_cmd = [python_exe, '-m', 'pip', 'install', module]
-            
-            print(f"正在尝试安装 {module}...")
-            try:
-                subprocess.check_call(pip_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                print(f"✅ {module} 安装成功")
-                installed.add(module)
-            except subprocess.CalledProcessError:
-                print(f"❌ 无法自动安装 {module}")
-            
-            # 如果pip不可用，提示用户手动安装
-            try:
-                subprocess.check_call([python_exe, '-m', 'pip', '--version'], 
-                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                print("\n" + "="*50)
-                print("系统缺少pip包管理器，请手动安装:")
-                print("1. 首先安装pip:")
-                print("   Ubuntu/Debian: sudo apt install python3-pip")
-                print("   CentOS/RHEL: sudo yum install python3-pip")
-                print("   Windows: python -m ensurepip")
-                print("2. 然后手动安装依赖:")
-                print(f"   pip install {module}")
-                print("="*50)
-                print("\n")
-    
-    # 再次检查所有依赖是否安装成功
-    if not all(importlib.util.find_spec(m) for m in required):
-        print("❌ 依赖安装失败，请手动安装必要的Python模块")
-        print("   运行: pip install requests")
-        sys.exit(1)
+# 日志文件轮转保留的备份数
+LOG_BACKUP_COUNT = 3
+
+# Cloudflare API域名及其解析结果的缓存时间（秒）
+CF_API_HOST = "api.cloudflare.com"
+CF_IP_TTL = 3600
+
+# HTTP超时 (连接, 读取)，连接阶段快速失败
+HTTP_TIMEOUT = (3.05, 7)
+# 兜底：未显式设置超时的socket操作
+socket.setdefaulttimeout(10)
+# IP服务错峰启动间隔（秒）：排名靠前的服务未在此时间内返回时再启动下一个
+IP_PROBE_HEAD_START = 0.5
+# 尚无统计数据的IP服务的默认延迟估计（毫秒）
+IP_DEFAULT_LATENCY_MS = 1000
 
-# 在脚本开头检查依赖
-check_dependencies()
+# 日志符号：Windows上使用纯ASCII替代（编码兼容），其他平台使用Unicode符号
+_WIN_SYMS = types.MappingProxyType({"ok": "[成功]", "refresh": "=>", "error": "[错误]", "warning": "[警告]"})
+_UNIX_SYMS = types.MappingProxyType({"ok": "✅", "refresh": "🔄", "error": "❌", "warning": "⚠️"})
+SYMS = _WIN_SYMS if sys.platform == "win32" else _UNIX_SYMS
 
-# 导入已确认安装的模块
-import requests
+# 公网IP查询服务
+IP_SERVICES = types.MappingProxyType({
+    "A": (
+        "https://api.ipify.org",
+        "https://ipv4.icanhazip.com",
+        "https://checkip.amazonaws.com"
+    ),
+    "AAAA": (
+        "https://api6.ipify.org",
+        "https://ipv6.icanhazip.com",
+        "https://v6.ident.me"
+    )
+})
 
 # 配置模板
 DEFAULT_CONFIG = {
@@ -76,22 +99,120 @@ DEFAULT_CONFIG = {
     "RECORD_NAME": "ddns.example.com",
     "RECORD_TYPE": "A",
     "TTL": 60,
+    "IP_CACHE_TTL": 60,
     "LOG_FILE": str(LOG_FILE)
 }
 
+def ttl_cache(seconds):
+    """按记录类型缓存方法结果，有效期取配置 IP_CACHE_TTL（默认 seconds 秒）"""
+    def decorator(func):
+        cache = {}
+        
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = (self.config["RECORD_TYPE"],)
+            ttl = self.config.get("IP_CACHE_TTL", seconds)
+            now = time.monotonic()
+            if key in cache and now - cache[key][0] < ttl:
+                return cache[key][1]
+            value = func(self, *args, **kwargs)
+            # 失败结果不缓存，下次调用重新获取
+            if value is not None:
+                cache[key] = (now, value)
+            return value
+        return wrapper
+    return decorator
+
+# 共享TLS上下文：CA证书只加载一次，所有连接池复用同一上下文
+SSL_CONTEXT = ssl.create_default_context(cafile=requests.certs.where())
+SSL_CONTEXT.minimum_version = ssl.TLSVersion.TLSv1_2
+
+class TLSAdapter(HTTPAdapter):
+    """使用共享TLS上下文的连接适配器
+    
+    指定 server_hostname 时，以IP直连但仍按该域名发送SNI并校验证书
+    """
+    def __init__(self, server_hostname=None, **kwargs):
+        # 父类构造函数会调用init_poolmanager，需先设置
+        self.server_hostname = server_hostname
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = SSL_CONTEXT
+        if self.server_hostname:
+            kwargs["server_hostname"] = self.server_hostname
+        return super().init_poolmanager(*args, **kwargs)
+
+class TokenBucket:
+    """令牌桶限流器，状态持久化到文件以便跨进程生效"""
+    def __init__(self, name, capacity, refill_rate, path=RATELIMIT_FILE):
+        self.name = name
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.path = path
+    
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return json_loads(f.read())
+        except (OSError, ValueError):
+            return {}
+    
+    def _save(self, data):
+        try:
+            with open(self.path, 'wb') as f:
+                f.write(json_dumps(data))
+        except OSError:
+            pass
+    
+    def acquire(self):
+        """取出一个令牌，桶空时等待补充（附带随机抖动）"""
+        while True:
+            data = self._load()
+            bucket = data.get(self.name, {})
+            now = time.time()
+            elapsed = max(0.0, now - bucket.get("updated_at", now))
+            tokens = min(self.capacity, bucket.get("tokens", self.capacity) + elapsed * self.refill_rate)
+            if tokens >= 1:
+                data[self.name] = {"tokens": tokens - 1, "updated_at": now}
+                self._save(data)
+                return
+            time.sleep((1 - tokens) / self.refill_rate + random.uniform(0, 0.1))
+
 class CloudflareDDNS:
-    def __init__(self):
+    def __init__(self, verbose=False):
         # 确保配置目录存在
         CFG_DIR.mkdir(parents=True, exist_ok=True)
+        self.verbose = verbose
+        self._started = False
         self.config = self.load_config()
         self.setup_logging()
+        self.setup_sessions()
         
+        # 新建记录的请求体模板，使用时只需填入content
+        self._record_body = {
+            "type": self.config["RECORD_TYPE"],
+            "name": self.config["RECORD_NAME"],
+            "ttl": self.config["TTL"],
+            "proxied": False
+        }
+        
+        self.build_urls()
+        
+    def build_urls(self):
+        """预先拼接API地址，配置在进程内不变"""
+        base = f"https://{self._cf_host}/client/v4/zones/{self.config['ZONE_ID']}"
+        self._list_url = (f"{base}/dns_records?name={quote(self.config['RECORD_NAME'])}"
+                          f"&type={self.config['RECORD_TYPE']}")
+        self._create_url = f"{base}/dns_records"
+        self._update_url_fmt = f"{base}/dns_records/{{}}"
+    
     def load_config(self):
         """加载或创建配置"""
         if CFG_FILE.exists():
             try:
-                with open(CFG_FILE, 'r') as f:
-                    config = json.load(f)
+                with open(CFG_FILE, 'rb') as f:
+                    config = json_loads(f.read())
                     # 验证必要配置
                     if not config.get("API_TOKEN") or not config.get("ZONE_ID"):
                         raise ValueError("缺少必要配置")
@@ -141,8 +262,8 @@ class CloudflareDDNS:
         config["LOG_FILE"] = log_input
         
         # 保存配置
-        with open(CFG_FILE, 'w') as f:
-            json.dump(config, f, indent=2)
+        with open(CFG_FILE, 'wb') as f:
+            f.write(json_dumps(config, indent=True))
             
         print("\n✅ 配置已保存至:", CFG_FILE)
         print("📝 日志将记录到:", config["LOG_FILE"])
@@ -156,32 +277,30 @@ class CloudflareDDNS:
         log_path.parent.mkdir(parents=True, exist_ok=True)
         
         self.logger = logging.getLogger("CloudflareDDNS")
-        self.logger.setLevel(logging.INFO)
+        self.logger.setLevel(logging.DEBUG if self.verbose else logging.INFO)
+        
+        # 无变化等常规信息：详细模式下按INFO完整记录，否则仅作为DEBUG输出
+        self.log_detail = self.logger.info if self.verbose else self.logger.debug
         
         # 移除所有已存在的处理器
         for handler in self.logger.handlers[:]:
             self.logger.removeHandler(handler)
         
-        # 日志文件处理器 - 使用UTF-8编码
-        file_handler = logging.FileHandler(log_path, encoding='utf-8')
+        # 日志文件处理器 - 使用UTF-8编码，按大小轮转，DEBUG信息不写入文件
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=1_000_000, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+        file_handler.setLevel(logging.INFO)
         file_handler.setFormatter(logging.Formatter(
             '%(asctime)s - %(levelname)s - %(message)s', 
             datefmt='%Y-%m-%d %H:%M:%S'
         ))
         self.logger.addHandler(file_handler)
         
-        # ASCII字符替代方案（Windows兼容）
-        # 在Windows上使用纯ASCII字符，其他平台使用Unicode符号
-        if sys.platform.startswith('win'):
-            self.success_symbol = "[成功]"
-            self.refresh_symbol = "=>"
-            self.error_symbol = "[错误]"
-            self.warning_symbol = "[警告]"
-        else:
-            self.success_symbol = "✅"
-            self.refresh_symbol = "🔄"
-            self.error_symbol = "❌"
-            self.warning_symbol = "⚠️"
+        self.success_symbol = SYMS["ok"]
+        self.refresh_symbol = SYMS["refresh"]
+        self.error_symbol = SYMS["error"]
+        self.warning_symbol = SYMS["warning"]
         
         # 控制台处理器
         console_handler = logging.StreamHandler()
@@ -191,88 +310,375 @@ class CloudflareDDNS:
         ))
         self.logger.addHandler(console_handler)
     
+    def setup_sessions(self):
+        """创建复用连接的HTTP会话"""
+        # Cloudflare API会话：GET/POST/PATCH复用同一个keep-alive连接
+        retries = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(500, 502, 503, 504),
+            # PATCH只修改content，重复提交结果一致，允许重试
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"PATCH"},
+            # 429由cf_api_request自行处理（限制等待时长并经过令牌桶），此处不按Retry-After重试
+            respect_retry_after_header=False
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", TLSAdapter(pool_connections=4, pool_maxsize=4, max_retries=retries))
+        self.session.headers.update({
+            "Host": CF_API_HOST,
+            "Authorization": f"Bearer {self.config['API_TOKEN']}",
+            "Content-Type": "application/json"
+        })
+        
+        # 使用缓存的API地址直连，省去每次启动的DNS解析
+        self._cf_host = CF_API_HOST
+        cf_ip = self.resolve_cf_ip()
+        if cf_ip:
+            self._cf_host = f"[{cf_ip}]" if ":" in cf_ip else cf_ip
+            self.session.mount(f"https://{self._cf_host}/", TLSAdapter(
+                server_hostname=CF_API_HOST,
+                pool_connections=4,
+                pool_maxsize=4,
+                max_retries=retries
+            ))
+        
+        # 客户端限流：每秒不超过4次，任意5分钟内不超过1000次（容量200 + 补充速率800/300秒）
+        self.buckets = (
+            TokenBucket("per_second", 4, 4.0),
+            TokenBucket("per_5min", 200, 800 / 300)
+        )
+        
+        # IP服务会话：不携带认证头，避免将Token发送给第三方
+        self.ip_session = requests.Session()
+        self.ip_session.mount("https://", TLSAdapter(pool_connections=4, pool_maxsize=4))
+    
+    def resolve_cf_ip(self):
+        """解析Cloudflare API地址，结果缓存到文件，解析失败返回None"""
+        try:
+            with open(CF_IP_FILE, 'rb') as f:
+                cached = json_loads(f.read())
+            if time.time() - cached["resolved_at"] < CF_IP_TTL:
+                return cached["ip"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        
+        try:
+            ip = socket.getaddrinfo(CF_API_HOST, 443, type=socket.SOCK_STREAM)[0][4][0]
+        except (OSError, IndexError):
+            return None
+        
+        try:
+            with open(CF_IP_FILE, 'wb') as f:
+                f.write(json_dumps({"ip": ip, "resolved_at": time.time()}))
+        except OSError:
+            pass
+        return ip
+    
+    @ttl_cache(60)
     def get_public_ip(self):
         """获取当前公网IP"""
-        services = {
-            "A": [
-                "https://api.ipify.org",
-                "https://ipv4.icanhazip.com",
-                "https://checkip.amazonaws.com"
-            ],
-            "AAAA": [
-                "https://api6.ipify.org",
-                "https://ipv6.icanhazip.com",
-                "https://v6.ident.me"
-            ]
-        }
+        stats = self.load_ip_stats()
+        now = time.time()
         
-        record_type = self.config["RECORD_TYPE"]
-        for service in services[record_type]:
-            try:
-                response = requests.get(service, timeout=10)
-                response.raise_for_status()
-                ip = response.text.strip()
+        # 按历史延迟和失败次数排序，连续失败被降级的服务仅在其余服务全部失败后再尝试
+        ranked = sorted(
+            IP_SERVICES[self.config["RECORD_TYPE"]],
+            key=lambda url: stats.get(url, {}).get("ewma_ms", IP_DEFAULT_LATENCY_MS) + stats.get(url, {}).get("fails", 0) * 500
+        )
+        active = [url for url in ranked if stats.get(url, {}).get("demoted_until", 0) <= now]
+        demoted = [url for url in ranked if url not in active]
+        
+        try:
+            for services in (active, demoted):
+                ip = self._race_ip_services(services, stats)
                 if ip:
-                    self.logger.info(f"获取到公网IP: {ip}")
+                    self.log_detail(f"获取到公网IP: {ip}")
                     return ip
-            except Exception as e:
-                self.logger.debug(f"IP服务 {service} 失败: {str(e)}")
-                continue
+        finally:
+            self.save_ip_stats(stats)
         
+        self.log_start()
         self.logger.error("所有IP服务均失败，无法获取公网IP地址")
         return None
     
-    def cf_api_request(self, method, endpoint, data=None):
-        """发送Cloudflare API请求"""
-        url = f"https://api.cloudflare.com/client/v4/zones/{self.config['ZONE_ID']}/{endpoint}"
-        headers = {
-            "Authorization": f"Bearer {self.config['API_TOKEN']}",
-            "Content-Type": "application/json"
-        }
+    def _race_ip_services(self, services, stats):
+        """按排名错峰请求一组IP服务，返回最先成功的结果
+        
+        排名靠前的服务先启动；若其在 IP_PROBE_HEAD_START 秒内未返回或已失败，
+        再启动下一个，避免单个服务卡住拖慢整体。统计只在主线程中更新。
+        """
+        results = queue.Queue()
+        waiting = list(services)
+        started = {}
+        running = set()
+        
+        def start_next():
+            service = waiting.pop(0)
+            started[service] = time.monotonic()
+            running.add(service)
+            threading.Thread(target=self._probe_ip, args=(service, results), daemon=True).start()
+        
+        if waiting:
+            start_next()
         
+        while running:
+            try:
+                service, ip, error, elapsed_ms = results.get(timeout=IP_PROBE_HEAD_START if waiting else None)
+            except queue.Empty:
+                # 当前服务响应较慢，启动下一个并行竞争
+                start_next()
+                continue
+            
+            running.discard(service)
+            self._record_probe(stats, service, ip, elapsed_ms)
+            if ip:
+                # 收集已返回的结果；仍未返回的服务以已耗时作为延迟下限记录
+                while True:
+                    try:
+                        other, other_ip, _, other_ms = results.get_nowait()
+                    except queue.Empty:
+                        break
+                    running.discard(other)
+                    self._record_probe(stats, other, other_ip, other_ms)
+                now = time.monotonic()
+                for other in running:
+                    self._record_latency_floor(stats, other, (now - started[other]) * 1000)
+                return ip
+            
+            self.logger.debug(f"IP服务 {service} 失败: {error}")
+            if waiting:
+                start_next()
+        return None
+    
+    def _record_latency(self, stats, service, elapsed_ms):
+        """更新服务延迟的指数加权平均"""
+        entry = stats.setdefault(service, {})
+        old = entry.get("ewma_ms")
+        entry["ewma_ms"] = elapsed_ms if old is None else 0.7 * old + 0.3 * elapsed_ms
+    
+    def _record_latency_floor(self, stats, service, elapsed_ms):
+        """记录未完成探测的已耗时：实际延迟至少为此值，只可能抬高估计，不参与平均"""
+        entry = stats.setdefault(service, {})
+        entry["ewma_ms"] = max(entry.get("ewma_ms", IP_DEFAULT_LATENCY_MS), elapsed_ms)
+    
+    def _record_probe(self, stats, service, ip, elapsed_ms):
+        """记录单次探测结果：成功更新延迟并清零失败次数，连续失败3次降级1小时"""
+        entry = stats.setdefault(service, {})
+        if ip:
+            self._record_latency(stats, service, elapsed_ms)
+            entry["fails"] = 0
+            return
+        
+        entry["fails"] = entry.get("fails", 0) + 1
+        if entry["fails"] >= 3:
+            entry["demoted_until"] = time.time() + 3600
+    
+    def load_ip_stats(self):
+        """读取IP服务的历史延迟统计"""
+        try:
+            with open(IP_STATS_FILE, 'rb') as f:
+                return json_loads(f.read())
+        except (OSError, ValueError):
+            return {}
+    
+    def save_ip_stats(self, stats):
+        """保存IP服务的历史延迟统计"""
         try:
-            if method == "GET":
-                response = requests.get(url, headers=headers)
-            elif method == "POST":
-                response = requests.post(url, headers=headers, json=data)
-            elif method == "PUT":
-                response = requests.put(url, headers=headers, json=data)
+            with open(IP_STATS_FILE, 'wb') as f:
+                f.write(json_dumps(stats))
+        except OSError as e:
+            self.logger.debug(f"IP服务统计写入失败: {e}")
+    
+    def _probe_ip(self, service, results):
+        """请求单个IP服务，结果放入队列 (service, ip, error, elapsed_ms)"""
+        ip, error, text = None, "未知错误", ""
+        start = time.monotonic()
+        try:
+            # 响应只有几十字节的ASCII，直接读取原始数据，跳过编码检测
+            with self.ip_session.get(service, stream=True, timeout=HTTP_TIMEOUT) as response:
+                response.raise_for_status()
+                text = response.raw.read(64, decode_content=True).decode("ascii", "ignore").strip()
+            
+            # 校验返回内容确实是对应类型的IP地址
+            version = 4 if self.config["RECORD_TYPE"] == "A" else 6
+            if ipaddress.ip_address(text).version == version:
+                ip, error = text, None
             else:
-                raise ValueError(f"不支持的HTTP方法: {method}")
-                
+                error = f"IP类型不匹配: {text}"
+        # 直接读取raw时底层异常不会被requests包装
+        except (requests.Timeout, requests.ConnectionError, ReadTimeoutError, ProtocolError) as e:
+            error = f"连接超时或失败: {e}"
+        except requests.RequestException as e:
+            error = str(e)
+        except ValueError:
+            error = f"无效的IP地址: {text!r}"
+        finally:
+            # 确保每个服务都有结果，避免主线程一直等待
+            results.put((service, ip, error, (time.monotonic() - start) * 1000))
+    
+    def load_state(self):
+        """读取上次成功更新的状态缓存"""
+        try:
+            with open(STATE_FILE, 'rb') as f:
+                return json_loads(f.read())
+        except (OSError, ValueError):
+            return {}
+    
+    def save_state(self, ip, record_id):
+        """记录本次成功更新的IP和记录ID"""
+        state = {
+            "ip": ip,
+            "record_id": record_id,
+            "zone_id": self.config["ZONE_ID"],
+            "name": self.config["RECORD_NAME"],
+            "type": self.config["RECORD_TYPE"],
+            "updated_at": time.time()
+        }
+        try:
+            with open(STATE_FILE, 'wb') as f:
+                f.write(json_dumps(state))
+        except OSError as e:
+            self.logger.debug(f"状态缓存写入失败: {e}")
+    
+    def clear_state(self):
+        """清除状态缓存"""
+        try:
+            STATE_FILE.unlink()
+        except FileNotFoundError:
+            pass
+    
+    def cf_api_request(self, method, url, data=None):
+        """发送Cloudflare API请求"""
+        
+        body = json_dumps(data) if data is not None else None
+        
+        try:
+            for attempt in range(2):
+                for bucket in self.buckets:
+                    bucket.acquire()
+                response = self.session.request(method, url, data=body, timeout=HTTP_TIMEOUT)
+                if response.status_code != 429 or attempt:
+                    break
+                # 触发Cloudflare限流，按Retry-After等待后重试一次
+                try:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                except ValueError:
+                    retry_after = 1.0
+                if not math.isfinite(retry_after):
+                    retry_after = 1.0
+                retry_after = max(0.0, min(retry_after, 30))
+                self.log_start()
+                self.logger.warning(f"{self.warning_symbol} 触发API限流，{retry_after:.0f}秒后重试")
+                time.sleep(retry_after + random.uniform(0, 0.5))
             response.raise_for_status()
-            return response.json()
+            return json_loads(response.content)
+                
+        except (requests.Timeout, requests.ConnectionError) as e:
+            # 缓存的IP可能已失效，回退到域名访问（读取超时说明已连通，不属于此情况）
+            if (not isinstance(e, requests.ReadTimeout)
+                    and self._cf_host != CF_API_HOST
+                    and url.startswith(f"https://{self._cf_host}/")):
+                self.logger.debug(f"直连 {self._cf_host} 失败，改用域名访问: {e}")
+                try:
+                    CF_IP_FILE.unlink()
+                except FileNotFoundError:
+                    pass
+                old_host, self._cf_host = self._cf_host, CF_API_HOST
+                self.build_urls()
                 
+                # POST非幂等，仅在确认连接未建立时重试，避免重复创建记录
+                if method != "POST" or isinstance(e, requests.ConnectTimeout):
+                    return self.cf_api_request(method, url.replace(old_host, CF_API_HOST, 1), data)
+            
+            error_msg = f"连接超时或失败: {e}"
+            self.log_start()
+            self.logger.error(f"API请求失败: {error_msg}")
+            return {"success": False, "status": None, "codes": [], "errors": [{"message": error_msg}]}
+        
         except requests.exceptions.RequestException as e:
             error_msg = str(e)
-            # 提取JSON错误信息（如果存在）
-            try:
-                error_resp = e.response.json()
-                if "errors" in error_resp:
-                    errors = ', '.join([err["message"] for err in error_resp["errors"]])
-                    error_msg = f"{e} | {errors}"
-            except:
-                pass
-                
+            resp = getattr(e, "response", None)
+            status = resp.status_code if resp is not None else None
+            codes = []
+            # 4xx说明缓存的记录可能已失效
+            if status is not None and 400 <= status < 500:
+                self.clear_state()
+            # 提取JSON错误信息（如果存在），复用已读取的响应内容
+            if resp is not None:
+                try:
+                    payload = json_loads(resp.content)
+                    errors = payload.get("errors") or []
+                    if errors:
+                        codes = [err.get("code") for err in errors]
+                        error_msg = f"{e} | " + ", ".join(err.get("message", "") for err in errors)
+                except (ValueError, AttributeError):
+                    pass
+            
+            self.log_start()
+            self.logger.error(f"API请求失败: {error_msg}")
+            return {"success": False, "status": status, "codes": codes, "errors": [{"message": error_msg}]}
+        
+        except ValueError as e:
+            error_msg = f"响应解析失败: {e}"
+            self.log_start()
             self.logger.error(f"API请求失败: {error_msg}")
-            return {"success": False, "errors": [{"message": error_msg}]}
+            return {"success": False, "status": None, "codes": [], "errors": [{"message": error_msg}]}
+    
+    def update_record(self, record_id, current_ip):
+        """更新指定ID的DNS记录 - 仅提交变化的content字段"""
+        return self.cf_api_request("PATCH", self._update_url_fmt.format(record_id), {"content": current_ip})
+    
+    def log_start(self):
+        """输出本次更新的开始标记（每次运行仅一次）"""
+        if not self._started:
+            self._started = True
+            self.logger.info(f"===== DDNS 更新开始 ({self.config['RECORD_NAME']}) =====")
     
     def update_dns(self):
         """主更新逻辑 - 使用平台相关符号"""
-        self.logger.info(f"===== DDNS 更新开始 ({self.config['RECORD_NAME']}) =====")
+        # 非详细模式下，开始标记推迟到确认需要更新或出错时再输出，IP未变化时不写入
+        self._started = False
+        if self.verbose:
+            self.log_start()
         
         # 获取当前IP
         current_ip = self.get_public_ip()
         if not current_ip:
+            self.log_start()
             self.logger.error("===== DDNS 更新失败 =====")
             return False
         
+        # IP与缓存一致且缓存未过期时，跳过Cloudflare查询
+        state = self.load_state()
+        same_record = (state.get("zone_id") == self.config["ZONE_ID"]
+                       and state.get("name") == self.config["RECORD_NAME"]
+                       and state.get("type") == self.config["RECORD_TYPE"])
+        if (same_record
+                and state.get("ip") == current_ip
+                and time.time() - state.get("updated_at", 0) < self.config["TTL"] * 10):
+            self.log_detail(f"{self.refresh_symbol} IP地址未变化，无需更新 (缓存)")
+            if self._started:
+                self.logger.info("===== DDNS 更新完成 =====")
+            return True
+        
+        # 已缓存记录ID时直接更新，省去查询请求
+        if same_record and state.get("record_id") and state.get("ip") != current_ip:
+            self.log_start()
+            self.logger.info(f"{self.refresh_symbol} 检测到IP变化: {state.get('ip')} → {current_ip}")
+            update_result = self.update_record(state["record_id"], current_ip)
+            
+            # 记录不存在 (404 / 81044) 时回退到查询流程
+            if update_result.get("status") == 404 or 81044 in update_result.get("codes", []):
+                self.logger.warning(f"{self.warning_symbol} 缓存的记录ID已失效，重新查询DNS记录")
+            else:
+                return self.finish_update(update_result, state["record_id"], current_ip)
+        
         # 查询现有DNS记录
-        query = f"dns_records?name={self.config['RECORD_NAME']}&type={self.config['RECORD_TYPE']}"
-        result = self.cf_api_request("GET", query)
+        result = self.cf_api_request("GET", self._list_url)
         
         if not result.get("success"):
             error = result.get("errors", [{}])[0].get("message", "未知错误")
+            self.log_start()
             self.logger.error(f"Cloudflare API错误: {error}")
             self.logger.error("===== DDNS 更新失败 =====")
             return False
@@ -281,20 +687,15 @@ class CloudflareDDNS:
         
         # 记录不存在则创建
         if not records:
+            self.log_start()
             self.logger.warning(f"{self.warning_symbol} 记录不存在，正在创建: {self.config['RECORD_NAME']}")
-            record_data = {
-                "type": self.config["RECORD_TYPE"],
-                "name": self.config["RECORD_NAME"],
-                "content": current_ip,
-                "ttl": self.config["TTL"],
-                "proxied": False
-            }
-            
-            create_result = self.cf_api_request("POST", "dns_records", record_data)
+            record_data = {**self._record_body, "content": current_ip}
+            create_result = self.cf_api_request("POST", self._create_url, record_data)
             
             if create_result.get("success"):
                 record_id = create_result["result"]["id"]
                 self.logger.info(f"{self.success_symbol} 创建成功! 记录ID: {record_id}")
+                self.save_state(current_ip, record_id)
                 self.logger.info("===== DDNS 更新完成 =====")
                 return True
             else:
@@ -305,6 +706,7 @@ class CloudflareDDNS:
         
         # 处理多条记录
         if len(records) > 1:
+            self.log_start()
             self.logger.warning(f"{self.warning_symbol} 找到 {len(records)} 条匹配记录，将使用第一条")
         
         record = records[0]
@@ -313,24 +715,23 @@ class CloudflareDDNS:
         
         # 检查IP是否变化
         if existing_ip == current_ip:
-            self.logger.info(f"{self.refresh_symbol} IP地址未变化，无需更新")
-            self.logger.info("===== DDNS 更新完成 =====")
+            self.log_detail(f"{self.refresh_symbol} IP地址未变化，无需更新")
+            self.save_state(current_ip, record_id)
+            if self._started:
+                self.logger.info("===== DDNS 更新完成 =====")
             return True
         
         # 更新DNS记录
+        self.log_start()
         self.logger.info(f"{self.refresh_symbol} 检测到IP变化: {existing_ip} → {current_ip}")
-        update_data = {
-            "type": self.config["RECORD_TYPE"],
-            "name": self.config["RECORD_NAME"],
-            "content": current_ip,
-            "ttl": self.config["TTL"],
-            "proxied": False
-        }
-        
-        update_result = self.cf_api_request("PUT", f"dns_records/{record_id}", update_data)
-        
+        update_result = self.update_record(record_id, current_ip)
+        return self.finish_update(update_result, record_id, current_ip)
+    
+    def finish_update(self, update_result, record_id, current_ip):
+        """处理更新结果并记录日志"""
         if update_result.get("success"):
             self.logger.info(f"{self.success_symbol} 更新成功! {self.config['RECORD_NAME']} → {current_ip}")
+            self.save_state(current_ip, record_id)
             self.logger.info("===== DDNS 更新完成 =====")
             return True
         else:
@@ -339,6 +740,28 @@ class CloudflareDDNS:
             self.logger.error("===== DDNS 更新失败 =====")
             return False
 
+    def run_daemon(self, interval):
+        """常驻模式 - 复用会话和连接，按固定间隔循环检查"""
+        stop = threading.Event()
+        
+        def handle_signal(signum, frame):
+            self.logger.info(f"收到退出信号 ({signum})，正在停止...")
+            stop.set()
+        
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+        
+        self.logger.info(f"常驻模式已启动，检查间隔: {interval}秒")
+        while not stop.is_set():
+            try:
+                self.update_dns()
+            except Exception as e:
+                # 单次检查异常不影响后续循环
+                self.logger.error(f"{self.error_symbol} 更新异常: {e}")
+            stop.wait(interval)
+        
+        self.logger.info("常驻模式已停止")
+
 def delete():
     """删除配置文件和日志文件"""
     deleted_files = []
@@ -348,11 +771,25 @@ def delete():
         CFG_FILE.unlink()
         deleted_files.append(f"配置文件: {CFG_FILE}")
     
-    # 删除日志文件（如果存在）
+    # 删除日志文件及轮转备份（如果存在）
     log_file = CFG_DIR / "cloudflare_ddns.log"
-    if log_file.exists():
-        log_file.unlink()
-        deleted_files.append(f"日志文件: {log_file}")
+    backups = [log_file.with_name(f"{log_file.name}.{i}") for i in range(1, LOG_BACKUP_COUNT + 1)]
+    for path in [log_file] + backups:
+        if path.exists():
+            path.unlink()
+            deleted_files.append(f"日志文件: {path}")
+    
+    # 删除状态缓存
+    cache_files = (
+        ("状态缓存", STATE_FILE),
+        ("限流状态", RATELIMIT_FILE),
+        ("地址缓存", CF_IP_FILE),
+        ("IP服务统计", IP_STATS_FILE)
+    )
+    for label, path in cache_files:
+        if path.exists():
+            path.unlink()
+            deleted_files.append(f"{label}: {path}")
     
     # 删除整个配置目录（如果为空）
     try:
@@ -365,11 +802,18 @@ def delete():
     return deleted_files
 
 if __name__ == "__main__":
+    import argparse
+    
     # 命令行参数解析
     parser = argparse.ArgumentParser(description='Cloudflare DDNS 更新脚本')
     parser.add_argument('-reconfig', action='store_true', help='重置配置文件并重新配置')
     parser.add_argument('-delete', action='store_true', help='删除所有配置文件和日志')
+    parser.add_argument('-daemon', action='store_true', help='常驻运行，按间隔循环检查')
+    parser.add_argument('-interval', type=int, default=60, help='常驻模式检查间隔秒数 (默认: 60)')
+    parser.add_argument('-verbose', action='store_true', help='输出详细日志（包括IP未变化时的完整记录）')
     args = parser.parse_args()
+    if args.interval < 1:
+        parser.error("检查间隔必须大于0")
     
     # 删除配置选项
     if args.delete:
@@ -384,6 +828,8 @@ if __name__ == "__main__":
     
     # 重新配置选项
     if args.reconfig:
+        # 状态缓存属于旧配置（Zone/Token可能已变化），一并清除
+        STATE_FILE.unlink(missing_ok=True)
         if CFG_FILE.exists():
             CFG_FILE.unlink()
             print("✅ 配置已重置")
@@ -393,7 +839,10 @@ if __name__ == "__main__":
         sys.exit()
     
     try:
-        ddns = CloudflareDDNS()
+        ddns = CloudflareDDNS(verbose=args.verbose)
+        if args.daemon:
+            ddns.run_daemon(args.interval)
+            sys.exit(0)
         success = ddns.update_dns()
         sys.exit(0 if success else 1)
     except KeyboardInterrupt: